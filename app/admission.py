@@ -0,0 +1,123 @@
+# app/admission.py
+"""
+Admission control for the API.
+
+Requests are admitted through a lane: at most `max_inflight` run at once,
+up to `max_queue` more wait (on the event loop, not on a worker thread) for
+at most `queue_timeout_s`, and everything beyond that is turned away with a
+Retry-After hint instead of piling onto the threadpool.
+
+- LEDGER: endpoints that submit to XRPL (start, pay). Kept well below the
+  threadpool size so a slow RPC node cannot starve everything else.
+- READ: history / inbox / balance polls, with their own capacity so they
+  are never queued behind ledger submissions.
+"""
+import asyncio
+import math
+import os
+import time
+from typing import Dict
+
+from fastapi import Depends, HTTPException
+
+
+class Lane:
+    def __init__(self, name: str, max_inflight: int, max_queue: int, queue_timeout_s: float):
+        self.name = name
+        self.max_inflight = max_inflight
+        self.max_queue = max_queue
+        self.queue_timeout_s = queue_timeout_s
+
+        self.inflight = 0
+        self.waiting = 0
+        self.admitted = 0
+        self.rejected_queue_full = 0
+        self.rejected_timeout = 0
+        self.avg_service_s = 1.0  # EWMA of time a slot is held
+        self._sem: asyncio.Semaphore | None = None
+
+    def configure(self, prefix: str):
+        self.max_inflight = int(os.getenv(f"{prefix}_MAX_INFLIGHT", self.max_inflight))
+        self.max_queue = int(os.getenv(f"{prefix}_MAX_QUEUE", self.max_queue))
+        self.queue_timeout_s = float(os.getenv(f"{prefix}_QUEUE_TIMEOUT_S", self.queue_timeout_s))
+        self._sem = None
+
+    def _retry_after(self) -> int:
+        backlog = self.waiting + self.inflight
+        return max(1, math.ceil(self.avg_service_s * backlog / max(self.max_inflight, 1)))
+
+    def _reject(self, status_code: int, detail: str):
+        raise HTTPException(
+            status_code=status_code,
+            detail=detail,
+            headers={"Retry-After": str(self._retry_after())},
+        )
+
+    async def acquire(self):
+        if self._sem is None:
+            self._sem = asyncio.Semaphore(self.max_inflight)
+
+        # counters, not _sem.locked(): a slot freed but not yet handed to a waiter
+        # still reads as free, which would let the queue grow past max_queue
+        if self.inflight + self.waiting >= self.max_inflight + self.max_queue:
+            self.rejected_queue_full += 1
+            self._reject(429, f"Too many {self.name} requests in flight, retry later.")
+
+        self.waiting += 1
+        try:
+            await asyncio.wait_for(self._sem.acquire(), timeout=self.queue_timeout_s)
+        except asyncio.TimeoutError:
+            self.rejected_timeout += 1
+            self._reject(503, f"{self.name} capacity saturated, retry later.")
+        finally:
+            self.waiting -= 1
+
+        self.inflight += 1
+        self.admitted += 1
+
+    def release(self, held_s: float):
+        self.inflight -= 1
+        self.avg_service_s = 0.8 * self.avg_service_s + 0.2 * held_s
+        self._sem.release()
+
+    def stats(self) -> Dict:
+        return {
+            "max_inflight": self.max_inflight,
+            "max_queue": self.max_queue,
+            "queue_timeout_s": self.queue_timeout_s,
+            "inflight": self.inflight,
+            "queue_depth": self.waiting,
+            "admitted": self.admitted,
+            "rejected_queue_full": self.rejected_queue_full,
+            "rejected_timeout": self.rejected_timeout,
+            "avg_service_s": round(self.avg_service_s, 3),
+        }
+
+
+LEDGER = Lane("ledger", max_inflight=8, max_queue=16, queue_timeout_s=2.0)
+READ = Lane("read", max_inflight=24, max_queue=64, queue_timeout_s=1.0)
+
+_LANES = {"LEDGER": LEDGER, "READ": READ}
+
+
+def configure_from_env():
+    """ADMISSION_<LANE>_MAX_INFLIGHT / _MAX_QUEUE / _QUEUE_TIMEOUT_S."""
+    for prefix, lane in _LANES.items():
+        lane.configure(f"ADMISSION_{prefix}")
+
+def admission_stats() -> Dict:
+    return {lane.name: lane.stats() for lane in _LANES.values()}
+
+
+def _admit(lane: Lane):
+    async def dependency():
+        await lane.acquire()
+        t0 = time.monotonic()
+        try:
+            yield
+        finally:
+            lane.release(time.monotonic() - t0)
+    return Depends(dependency)
+
+ledger_lane = _admit(LEDGER)
+read_lane = _admit(READ)
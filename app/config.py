@@ -7,5 +7,8 @@ ESCROW_CANCEL_AFTER_S = 900  # not used for refunds in MVP, but required by tx
 # App-level "payment request expires" timer
 REQUEST_EXPIRES_S = 120  # 2 mins -> mark as Expired in history/UI
 
+# Handles whose seeds are imported from .env (<HANDLE>_SEED) into the keystore
+DEMO_HANDLES = ("alice", "bob", "chen")
+
 DEMO_TOKEN_CODE = "RUSD" 
 DEMO_TOKEN_NAME = "RLUSD-demo"
\ No newline at end of file
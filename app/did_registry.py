@@ -1,14 +1,18 @@
 # app/did_registry.py
 from .state import STATE
+from .config import DEMO_HANDLES
+
+DID_PREFIX = "did:ripplit:"
 
 def seed_demo_dids():
-    STATE["dids"] = {
-        "did:ripplit:alice": STATE["wallets"]["alice"].classic_address,
-        "did:ripplit:bob": STATE["wallets"]["bob"].classic_address,
-        "did:ripplit:chen": STATE["wallets"]["chen"].classic_address,
-    }
+    ks = STATE["keystore"]
+    STATE["dids"] = {f"{DID_PREFIX}{h}": ks.address(h) for h in DEMO_HANDLES if h in ks}
 
 def resolve_did(did: str) -> str:
-    if did not in STATE["dids"]:
-        raise ValueError(f"Unknown DID: {did}")
-    return STATE["dids"][did]
+    if did in STATE["dids"]:
+        return STATE["dids"][did]
+    # every keystore handle has an implicit did:ripplit:<handle>
+    handle = did[len(DID_PREFIX):] if did.startswith(DID_PREFIX) else ""
+    if STATE["keystore"] is not None and handle in STATE["keystore"]:
+        return STATE["keystore"].address(handle)
+    raise ValueError(f"Unknown DID: {did}")
@@ -0,0 +1,160 @@
+# app/fx.py
+"""
+Shared XRP exchange-rate cache.
+
+One refresher thread fetches rates from a pluggable source every
+FX_REFRESH_SECONDS; every wallet reads the cached snapshot from /api/fx, so
+upstream load no longer scales with open tabs. Reads past the TTL still get
+the last good rates (flagged `stale`) while a single background refresh
+runs (stale-while-revalidate); after a failed fetch, reads wait a full TTL
+before trying upstream again. Checkout quotes refuse rates older than
+FX_MAX_QUOTE_AGE_SECONDS.
+
+Rates are quoted as fiat per 1 XRP, like Coinbase's
+`/v2/exchange-rates?currency=XRP`.
+"""
+import json
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Optional
+
+import httpx
+
+DEFAULT_CURRENCIES = ("USD", "EUR", "SGD")
+DEFAULT_FIXTURE = Path(__file__).resolve().parent / "fx_fixture.json"
+
+
+# ---- sources ----
+
+class CoinbaseSource:
+    name = "coinbase"
+    url = "https://api.coinbase.com/v2/exchange-rates?currency=XRP"
+
+    def fetch(self) -> Dict[str, float]:
+        resp = httpx.get(self.url, timeout=10.0)
+        resp.raise_for_status()
+        rates = resp.json()["data"]["rates"]
+        return {k: float(v) for k, v in rates.items()}
+
+class FixtureSource:
+    """Offline source: a JSON file of {"USD": 0.52, ...} (fiat per XRP)."""
+    name = "fixture"
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+
+    def fetch(self) -> Dict[str, float]:
+        data = json.loads(self.path.read_text(encoding="utf-8"))
+        return {k: float(v) for k, v in data.items()}
+
+def source_from_env():
+    kind = os.getenv("FX_SOURCE", "coinbase").lower()
+    if kind == "fixture":
+        return FixtureSource(Path(os.getenv("FX_FIXTURE_PATH", str(DEFAULT_FIXTURE))))
+    if kind == "coinbase":
+        return CoinbaseSource()
+    raise RuntimeError(f"Unknown FX_SOURCE: {kind}")
+
+
+# ---- cache ----
+
+class FxCache:
+    def __init__(self, source, ttl_s: float = 30.0, currencies=DEFAULT_CURRENCIES, max_quote_age_s: float = 300.0):
+        self.source = source
+        self.ttl_s = ttl_s
+        self.currencies = tuple(currencies)
+        self.max_quote_age_s = max_quote_age_s
+        self.rates: Dict[str, float] = {}
+        self.fetched_at: Optional[float] = None
+        self.attempted_at: Optional[float] = None
+        self.last_error: Optional[str] = None
+        self.fetches = 0
+        self._refreshing = False
+        self._lock = threading.Lock()
+
+    def refresh(self):
+        """Fetch once; concurrent callers share the in-flight fetch instead of starting another."""
+        with self._lock:
+            if self._refreshing:
+                return
+            self._refreshing = True
+            self.attempted_at = time.time()
+        try:
+            rates = self.source.fetch()
+            self.fetches += 1
+            self.rates = {c: rates[c] for c in self.currencies if c in rates}
+            self.fetched_at = time.time()
+            self.last_error = None
+        except Exception as e:
+            self.last_error = str(e)
+            print("FX: refresh failed:", e)
+        finally:
+            with self._lock:
+                self._refreshing = False
+
+    def age_s(self) -> Optional[float]:
+        return None if self.fetched_at is None else time.time() - self.fetched_at
+
+    def is_stale(self) -> bool:
+        age = self.age_s()
+        return age is None or age > self.ttl_s
+
+    def _should_revalidate(self) -> bool:
+        if self._refreshing or not self.is_stale():
+            return False
+        # the refresher thread retries every TTL anyway; reads only help when it is behind
+        return self.attempted_at is None or time.time() - self.attempted_at >= self.ttl_s
+
+    def snapshot(self) -> Dict:
+        if self._should_revalidate():
+            threading.Thread(target=self.refresh, name="fx-revalidate", daemon=True).start()
+        return {
+            "base": "XRP",
+            "rates": dict(self.rates),
+            "updated_at_unix": int(self.fetched_at) if self.fetched_at else None,
+            "stale": self.is_stale(),
+            "source": self.source.name,
+            "ttl_s": self.ttl_s,
+        }
+
+    def xrp_per(self, currency: str) -> Optional[float]:
+        rate = self.rates.get(currency)
+        return (1.0 / rate) if rate else None
+
+    def quote_xrp_per(self, currency: str) -> Optional[float]:
+        """xrp_per for pricing a checkout: raises if the cached rate is older than max_quote_age_s."""
+        rate = self.xrp_per(currency)
+        age = self.age_s()
+        if rate is not None and age is not None and age > self.max_quote_age_s:
+            raise ValueError(f"XRP/{currency} rate is {int(age)}s old; quotes are paused until FX refreshes.")
+        return rate
+
+
+FX: Optional[FxCache] = None
+_STOP = threading.Event()
+_THREAD: Optional[threading.Thread] = None
+
+
+def _loop(cache: FxCache):
+    while True:
+        cache.refresh()
+        if _STOP.wait(cache.ttl_s):
+            return
+
+def start_fx_refresher():
+    global FX, _THREAD
+    currencies = tuple(c.strip().upper() for c in os.getenv("FX_CURRENCIES", ",".join(DEFAULT_CURRENCIES)).split(",") if c.strip())
+    FX = FxCache(
+        source_from_env(),
+        ttl_s=float(os.getenv("FX_REFRESH_SECONDS", "30")),
+        currencies=currencies,
+        max_quote_age_s=float(os.getenv("FX_MAX_QUOTE_AGE_SECONDS", "300")),
+    )
+    _STOP.clear()
+    _THREAD = threading.Thread(target=_loop, args=(FX,), name="fx-refresher", daemon=True)
+    _THREAD.start()
+
+def stop_fx_refresher():
+    _STOP.set()
@@ -1,51 +1,44 @@
+import threading
 import time
 import uuid
 from typing import Dict, List
 
 import httpx
 
-from .state import STATE
+from .state import STATE, touch
 from .models import Participant, User, StartFromRedirect
 from .did_registry import resolve_did
-from .xrpl_service import escrow_create, escrow_finish, wait_until_finishable
+from .xrpl_service import (
+    BatchAborted, TxFailed, escrow_create, escrow_finish_batch, ripple_time_now, send_payment, tx_outcome,
+    wait_until_finishable,
+)
 from .config import REQUEST_EXPIRES_S
+from . import fx
+
+# Guards the order_id -> request_id check-and-reserve in create_request_from_redirect.
+_START_LOCK = threading.Lock()
+
+# request_ids currently being settled, by a request thread or the ledger reconciler
+_SETTLE_LOCK = threading.Lock()
+_SETTLING: set = set()
 
 def _id(prefix: str) -> str:
     return f"{prefix}_{str(uuid.uuid4())[:8]}"
 
 def ensure_inited():
-    if not STATE["wallets"] or STATE["merchant"] is None or STATE["coordinator"] is None:
+    if STATE["keystore"] is None or STATE["merchant"] is None or STATE["coordinator"] is None:
         raise RuntimeError("Ripplit not initialized. Click 'Initialize Wallet' first.")
 
 def _now() -> int:
     return int(time.time())
 
-def _compute_status(req: Dict) -> str:
+def compute_status(req: Dict) -> str:
     if req["status"] == "FULFILLED":
         return "FULFILLED"
     if _now() >= req["expires_at_unix"]:
         return "EXPIRED"
     return "PENDING"
 
-def list_history():
-    ensure_inited()
-    out = []
-    for req_id, req in STATE["requests"].items():
-        status = _compute_status(req)
-        if status == "EXPIRED" and req["status"] != "FULFILLED":
-            req["status"] = "EXPIRED"
-            STATE["requests"][req_id] = req
-        out.append({
-            "request_id": req_id,
-            "order_id": req["order_id"],
-            "total_xrp": req["total_xrp"],
-            "status": _compute_status(req),
-            "created_at_unix": req["created_at_unix"],
-            "expires_at_unix": req["expires_at_unix"],
-        })
-    out.sort(key=lambda x: x["created_at_unix"], reverse=True)
-    return out
-
 
 DEFAULT_RLUSD_TO_XRP = 0.50   # fallback: 1 RLUSD ~= 0.50 XRP
 QUOTE_BUFFER = 1.02          # +2% buffer to avoid underpay due to spread / movement
@@ -65,27 +58,45 @@ def quote_rlusd_to_xrp(total_rlusd: float) -> Dict:
     rl = float(total_rlusd)
 
     # TODO: Replace with real AMM quote (amm_info / book_offers).
-    rate = float(DEFAULT_RLUSD_TO_XRP)
+    # Until then RLUSD is priced as USD from the shared FX cache (same rate the
+    # wallets show); the constant is only for runs without the FX cache.
+    if fx.FX is None:
+        rate, source = float(DEFAULT_RLUSD_TO_XRP), "fallback_constant"
+    else:
+        rate = fx.FX.quote_xrp_per("USD")
+        if not rate:
+            raise ValueError("No XRP/USD rate yet; retry once FX has refreshed.")
+        source = f"fx_cache_{fx.FX.source.name}"
     total_xrp = rl * rate * QUOTE_BUFFER
 
     return {
         "rate_xrp_per_rlusd": rate,
         "total_xrp": round(total_xrp, 6),
         "buffer": QUOTE_BUFFER,
-        "source": "fallback_constant",
+        "source": source,
     }
 
 def create_request_from_redirect(req: StartFromRedirect) -> Dict:
     ensure_inited()
 
+    # A retried redirect for the same merchant order gets the existing request
+    # back instead of a second request and a second set of escrows.
+    existing = STATE["orders"].get(req.order_id)
+    if existing is not None:
+        return STATE["requests"][existing]
+
     vault_address = STATE["coordinator"].classic_address
     merchant_address = STATE["merchant"].classic_address
 
-    selected = [u for u in req.selected_payees if u in ["bob", "chen"]]
-    participants_users: List[User] = ["alice"] + selected
+    ks = STATE["keystore"]
+    initiator = req.initiator
+    if initiator not in ks:
+        raise ValueError(f"Unknown user: {initiator}")
+    selected = [u for u in dict.fromkeys(req.selected_payees) if u != initiator and u in ks]
+    participants_users: List[User] = [initiator] + selected
     n = len(participants_users)
     if n < 2:
-        raise ValueError("Select at least one co-payee (Bob or Chen).")
+        raise ValueError("Select at least one co-payee.")
 
     created_at = _now()
     expires_at = created_at + REQUEST_EXPIRES_S
@@ -145,10 +156,33 @@ def create_request_from_redirect(req: StartFromRedirect) -> Dict:
         "finish_tx_hashes": {},
     }
 
-    STATE["requests"][request_id] = request_obj
-
-    # Alice immediately pays her share (escrow create)
-    _pay_internal(request_id, "alice")
+    with _START_LOCK:
+        existing = STATE["orders"].get(req.order_id)
+        if existing is not None:
+            return STATE["requests"][existing]
+        STATE["requests"][request_id] = request_obj
+        STATE["orders"][req.order_id] = request_id
+        STATE["open_requests"].add(request_id)
+
+    # The initiator immediately pays their share (escrow create). If that
+    # definitely failed (never signed, rejected, or expired unvalidated), release
+    # the order so a retried redirect starts over. If the outcome is unknown the
+    # EscrowCreate may still land, so the request is kept: retries get it back
+    # and the reconciler marks the share PAID from the memo.
+    signed = []
+    try:
+        _pay_internal(request_id, initiator, on_signed=lambda tx_hash, _: signed.append(tx_hash))
+    except Exception as e:
+        if signed and not isinstance(e, TxFailed):
+            raise
+        with _START_LOCK:
+            if STATE["orders"].get(req.order_id) == request_id:
+                del STATE["orders"][req.order_id]
+            STATE["requests"].pop(request_id, None)
+            STATE["open_requests"].discard(request_id)
+        from .views import evict_row  # views imports this module
+        evict_row(request_id)
+        raise
 
     return STATE["requests"][request_id]
 
@@ -156,7 +190,7 @@ def inbox_for(user: User):
     ensure_inited()
     out = []
     for req in STATE["requests"].values():
-        status = _compute_status(req)
+        status = compute_status(req)
         if status != "PENDING":
             continue
         if user not in req["participants"]:
@@ -172,13 +206,14 @@ def pay(request_id: str, payer: User) -> Dict:
         raise ValueError("Unknown request_id")
     return _pay_internal(request_id, payer)
 
-def _pay_internal(request_id: str, payer: User) -> Dict:
+def _pay_internal(request_id: str, payer: User, on_signed=None) -> Dict:
     req = STATE["requests"][request_id]
-    status = _compute_status(req)
+    status = compute_status(req)
 
     if status == "EXPIRED":
-        req["status"] = "EXPIRED"
-        STATE["requests"][request_id] = req
+        if req["status"] != "EXPIRED":
+            req["status"] = "EXPIRED"
+            touch(req)
         return req
 
     if status == "FULFILLED":
@@ -191,45 +226,111 @@ def _pay_internal(request_id: str, payer: User) -> Dict:
     if p["status"] == "PAID":
         return req
 
-    payer_wallet = STATE["wallets"][payer]
+    payer_wallet = STATE["keystore"].wallet(payer)
 
     vault_dest = req.get("vault_address") or STATE["coordinator"].classic_address
     print("ESCROW DEST:", (req.get("vault_address")), "MERCHANT:", req.get("merchant_address"))
-    info = escrow_create(payer_wallet, vault_dest, float(p["share_xrp"]))
+    info = escrow_create(payer_wallet, vault_dest, float(p["share_xrp"]), request_id=request_id, on_signed=on_signed)
 
     p["status"] = "PAID"
     p["escrow_owner"] = payer_wallet.classic_address
     p["escrow_offer_sequence"] = info["sequence"]
     p["escrow_create_tx_hash"] = info["tx_hash"]
+    p["escrow_cancel_after"] = info.get("cancel_after")
     req["participants"][payer] = p
+    touch(req)
 
     if all(pp["status"] == "PAID" for pp in req["participants"].values()):
-        _settle_and_callback(req)
+        settle(req)
 
     STATE["requests"][request_id] = req
     return req
 
-def _settle_and_callback(req: Dict):
-    wait_until_finishable()
-    finisher = STATE["coordinator"]
-    finish_hashes = {}
-
-    for u, p in req["participants"].items():
-        finish_hashes[u] = escrow_finish(
-            finisher_wallet=finisher,
-            owner_address=p["escrow_owner"],
-            offer_sequence=int(p["escrow_offer_sequence"]),
+def needs_settlement(req: Dict) -> bool:
+    """
+    All shares escrowed (none cancelled) but escrows not all finished or the
+    merchant not yet paid. False once an unfinished escrow is past CancelAfter:
+    it can no longer be finished, and ledger_sync cancels it instead.
+    """
+    ps = req["participants"].values()
+    if not all(p["status"] == "PAID" for p in ps):
+        return False
+    if any(p.get("escrow_cancel_tx_hash") or p.get("escrow_closed") for p in ps):
+        return False
+    unfinished = [p for u, p in req["participants"].items() if not req["finish_tx_hashes"].get(u)]
+    if unfinished:
+        now_ripple = ripple_time_now()
+        return not any(
+            p.get("escrow_cancel_after") is not None and int(p["escrow_cancel_after"]) < now_ripple
+            for p in unfinished
         )
+    return not req.get("merchant_payment_tx_hash")
+
+def settle(req: Dict):
+    """Run (or resume) settlement unless another thread is already settling this request."""
+    rid = req["request_id"]
+    with _SETTLE_LOCK:
+        if rid in _SETTLING:
+            return
+        _SETTLING.add(rid)
+    try:
+        _settle_and_callback(req)
+    finally:
+        with _SETTLE_LOCK:
+            _SETTLING.discard(rid)
 
-    req["finish_tx_hashes"] = finish_hashes
-    req["status"] = "FULFILLED"
+def _settle_and_callback(req: Dict):
+    # Only escrows without a finish hash are finished, so this also resumes a
+    # settlement that died part-way (see ledger_sync).
+    pending = {
+        u: (p["escrow_owner"], int(p["escrow_offer_sequence"]))
+        for u, p in req["participants"].items()
+        if not req["finish_tx_hashes"].get(u)
+    }
+    if pending:
+        wait_until_finishable()
+        try:
+            finish_hashes = escrow_finish_batch(
+                finisher_wallet=STATE["coordinator"],
+                escrows=pending,
+                request_id=req["request_id"],
+            )
+        except BatchAborted as e:
+            # keep what landed; the next settle / reconciler pass finishes the rest
+            req["finish_tx_hashes"].update(e.done)
+            touch(req)
+            raise
+        req["finish_tx_hashes"].update(finish_hashes)
+        req["status"] = "FULFILLED"
+        touch(req)
+
+    if req.get("merchant_payment_tx_hash"):
+        return
+
+    # A payment from an earlier attempt may still be in flight (e.g. the RPC
+    # timed out while waiting). Only pay again once that exact tx can no
+    # longer validate.
+    sent = req.get("merchant_payment_pending")
+    if sent:
+        try:
+            res = tx_outcome(sent["tx_hash"], sent["last_ledger_sequence"])
+        except TxFailed:
+            res = None
+        else:
+            if res is None:
+                return  # still pending; the next pass looks again
+            req["merchant_payment_tx_hash"] = res.get("hash", sent["tx_hash"])
+            req.pop("merchant_payment_pending", None)
+            touch(req)
+            return
+        req.pop("merchant_payment_pending", None)
 
     payload = {
         "order_id": req["order_id"],
         "status": "PAID",
         "details": {
             "ripplit_request_id": req["request_id"],
-            "finish_tx_hashes": finish_hashes,
+            "finish_tx_hashes": req["finish_tx_hashes"],
             "escrow_create_hashes": {u: req["participants"][u]["escrow_create_tx_hash"] for u in req["participants"]},
         },
     }
@@ -239,12 +340,22 @@ def _settle_and_callback(req: Dict):
     except Exception:
         pass
 
-    from .xrpl_service import send_payment
+    def record(tx_hash: str, last_ledger_sequence: int):
+        # written before the submit, so a retry can tell whether this payment landed
+        req["merchant_payment_pending"] = {"tx_hash": tx_hash, "last_ledger_sequence": last_ledger_sequence}
+        touch(req)
 
     vault = STATE["coordinator"]
     merchant = req["merchant_address"]
-    pay_hash = send_payment(vault, merchant, float(req["total_xrp"]))
+    try:
+        pay_hash = send_payment(vault, merchant, float(req["total_xrp"]), request_id=req["request_id"], on_signed=record)
+    except TxFailed:
+        req.pop("merchant_payment_pending", None)
+        touch(req)
+        raise
     req["merchant_payment_tx_hash"] = pay_hash
+    req.pop("merchant_payment_pending", None)
+    touch(req)
 
     def history_for(user: str):
         ensure_inited()
@@ -253,7 +364,7 @@ def _settle_and_callback(req: Dict):
             if user not in req["participants"]:
                 continue
 
-            status = _compute_status(req)
+            status = compute_status(req)
 
             # unpaid list for pending requests
             unpaid = []
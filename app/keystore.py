@@ -0,0 +1,176 @@
+# app/keystore.py
+"""
+Custodial keystore: one AES-GCM encrypted seed file per handle.
+
+Nothing is read at startup. A handle's file is opened the first time it is
+used, and the derived `Wallet` (seed -> keypair derivation is not free) is
+kept in a bounded LRU, so memory and startup time track active users rather
+than the total user count.
+"""
+import hashlib
+import json
+import os
+import re
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, Optional
+
+from Crypto.Cipher import AES
+from xrpl.wallet import Wallet
+
+HANDLE_RE = re.compile(r"^[a-z0-9_]{1,32}$")
+
+DEFAULT_CACHE_SIZE = 1024
+_META_FILE = "keystore.json"
+_CHECK_PLAINTEXT = b"ripplit-keystore"
+
+
+def valid_handle(handle: str) -> bool:
+    return bool(HANDLE_RE.match(handle or ""))
+
+
+class Keystore:
+    def __init__(self, directory: Path, passphrase: str, cache_size: int = DEFAULT_CACHE_SIZE):
+        self.dir = Path(directory)
+        self.dir.mkdir(parents=True, exist_ok=True)
+        self.cache_size = int(cache_size)
+        self._wallets: "OrderedDict[str, Wallet]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._key = self._open(passphrase)
+
+    # ---- master key (scrypt runs once per process) ----
+
+    def _open(self, passphrase: str) -> bytes:
+        meta_path = self.dir / _META_FILE
+        if meta_path.exists():
+            meta = json.loads(meta_path.read_text(encoding="utf-8"))
+            key = self._kdf(passphrase, meta)
+            try:
+                self._decrypt(key, meta["check"])
+            except ValueError:
+                raise RuntimeError("KEYSTORE_PASSPHRASE does not match this keystore")
+            return key
+
+        meta = {"kdf": "scrypt", "salt": os.urandom(16).hex(), "n": 2 ** 14, "r": 8, "p": 1}
+        key = self._kdf(passphrase, meta)
+        meta["check"] = self._encrypt(key, _CHECK_PLAINTEXT)
+        meta_path.write_text(json.dumps(meta), encoding="utf-8")
+        return key
+
+    @staticmethod
+    def _kdf(passphrase: str, meta: Dict) -> bytes:
+        return hashlib.scrypt(
+            passphrase.encode("utf-8"),
+            salt=bytes.fromhex(meta["salt"]),
+            n=int(meta["n"]), r=int(meta["r"]), p=int(meta["p"]),
+            dklen=32,
+        )
+
+    @staticmethod
+    def _encrypt(key: bytes, plaintext: bytes) -> Dict[str, str]:
+        cipher = AES.new(key, AES.MODE_GCM)
+        ct, tag = cipher.encrypt_and_digest(plaintext)
+        return {"nonce": cipher.nonce.hex(), "ciphertext": ct.hex(), "tag": tag.hex()}
+
+    @staticmethod
+    def _decrypt(key: bytes, blob: Dict[str, str]) -> bytes:
+        cipher = AES.new(key, AES.MODE_GCM, nonce=bytes.fromhex(blob["nonce"]))
+        return cipher.decrypt_and_verify(bytes.fromhex(blob["ciphertext"]), bytes.fromhex(blob["tag"]))
+
+    # ---- records ----
+
+    def _path(self, handle: str) -> Path:
+        if not valid_handle(handle):
+            raise ValueError(f"Invalid handle: {handle!r}")
+        return self.dir / f"{handle}.json"
+
+    def _record(self, handle: str) -> Optional[Dict]:
+        try:
+            return json.loads(self._path(handle).read_text(encoding="utf-8"))
+        except FileNotFoundError:
+            return None
+
+    def __contains__(self, handle: str) -> bool:
+        return valid_handle(handle) and self._path(handle).exists()
+
+    def import_seed(self, handle: str, seed: str, overwrite: bool = False) -> str:
+        """Encrypt and store `seed` for `handle`. Returns the classic address."""
+        path = self._path(handle)
+        if path.exists() and not overwrite:
+            return self.address(handle)
+
+        wallet = Wallet.from_seed(seed)
+        record = {
+            "handle": handle,
+            "address": wallet.classic_address,
+            "seed": self._encrypt(self._key, seed.encode("utf-8")),
+        }
+        tmp = path.with_suffix(".json.tmp")
+        tmp.write_text(json.dumps(record), encoding="utf-8")
+        os.replace(tmp, path)
+
+        with self._lock:
+            self._remember(handle, wallet)
+        return wallet.classic_address
+
+    def sync_seed(self, handle: str, seed: str) -> str:
+        """Import `seed` for `handle`, replacing the stored seed if it belongs to a different address."""
+        if handle not in self:
+            return self.import_seed(handle, seed)
+        address = Wallet.from_seed(seed).classic_address
+        stored = self.address(handle)
+        if stored != address:
+            print(f"KEYSTORE: seed for {handle} changed ({stored} -> {address}), replacing stored seed")
+            with self._lock:
+                self._wallets.pop(handle, None)
+            return self.import_seed(handle, seed, overwrite=True)
+        return stored
+
+    # ---- lookups ----
+
+    def address(self, handle: str) -> str:
+        """Classic address without decrypting the seed."""
+        with self._lock:
+            w = self._wallets.get(handle)
+        if w is not None:
+            return w.classic_address
+        record = self._record(handle)
+        if record is None:
+            raise KeyError(handle)
+        return record["address"]
+
+    def wallet(self, handle: str) -> Wallet:
+        with self._lock:
+            w = self._wallets.get(handle)
+            if w is not None:
+                self._wallets.move_to_end(handle)
+                return w
+
+        record = self._record(handle)
+        if record is None:
+            raise KeyError(handle)
+        seed = self._decrypt(self._key, record["seed"]).decode("utf-8")
+        w = Wallet.from_seed(seed)
+
+        with self._lock:
+            self._remember(handle, w)
+        return w
+
+    def _remember(self, handle: str, wallet: Wallet):
+        self._wallets[handle] = wallet
+        self._wallets.move_to_end(handle)
+        while len(self._wallets) > self.cache_size:
+            self._wallets.popitem(last=False)
+
+
+def open_keystore() -> Keystore:
+    passphrase = os.getenv("KEYSTORE_PASSPHRASE")
+    if not passphrase:
+        raise RuntimeError("Missing KEYSTORE_PASSPHRASE in .env")
+    default = Path(__file__).resolve().parents[1] / ".keystore"
+    return Keystore(
+        Path(os.getenv("KEYSTORE_DIR", str(default))),
+        passphrase,
+        cache_size=int(os.getenv("KEYSTORE_CACHE_SIZE", DEFAULT_CACHE_SIZE)),
+    )
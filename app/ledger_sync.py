@@ -0,0 +1,377 @@
+# app/ledger_sync.py
+"""
+Background reconciler: streams account_tx for the vault and participant
+accounts and repairs STATE["requests"] from what actually landed on ledger.
+
+Each account keeps a cursor (last fully processed ledger + an in-progress
+page marker) persisted to disk, so every pass only reads ledgers it has not
+seen yet and a restart resumes where the last pass stopped.
+
+Every Ripplit escrow seen on ledger is also recorded in the same file until
+its EscrowFinish/EscrowCancel shows up. If its request is no longer in
+memory (the process died and STATE was lost) it is an orphan: it is
+reported by run_pass and cancelled back to its owner once CancelAfter has
+passed; so is an unfinished escrow of a known request. Requests whose shares
+are all escrowed but whose settlement never completed are handed back to
+group_pay.settle, with exponential backoff between failed attempts.
+
+A pass only looks at open requests (state.open_requests), so its cost
+tracks in-flight checkouts and new ledgers, not total history.
+"""
+import json
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Iterable, Optional, Tuple
+
+from .state import STATE, open_requests, touch
+from .xrpl_service import (
+    TxFailed, account_tx_page, escrow_cancel_submit, latest_validated_ledger, request_id_from_memos,
+    ripple_time_now, wait_for_tx,
+)
+from .group_pay import compute_status, needs_settlement, settle
+
+# On first run (no cursor yet) look back roughly one escrow cancel window
+# (~15 min at ~3.5s/ledger) instead of scanning the account's whole history.
+DEFAULT_BOOTSTRAP_LEDGERS = 256
+
+# Failed settlement resumes back off 15s, 30s, 60s, ... up to 10 min.
+RESUME_BACKOFF_BASE_S = 15.0
+RESUME_BACKOFF_MAX_S = 600.0
+
+_PASS_LOCK = threading.Lock()
+_STOP = threading.Event()
+_THREAD: Optional[threading.Thread] = None
+_RESUME_RETRY: Dict[str, Tuple[int, float]] = {}  # request_id -> (failures, monotonic time of next attempt)
+
+
+def _markers_path() -> Path:
+    default = Path(__file__).resolve().parents[1] / ".ledger_sync.json"
+    return Path(os.getenv("LEDGER_SYNC_STATE_PATH", str(default)))
+
+def load_markers() -> Dict:
+    path = _markers_path()
+    if not path.exists():
+        return {"accounts": {}, "escrows": {}}
+    with open(path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    data.setdefault("accounts", {})
+    data.setdefault("escrows", {})
+    return data
+
+def save_markers(markers: Dict):
+    path = _markers_path()
+    tmp = path.with_suffix(path.suffix + ".tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(markers, f)
+    os.replace(tmp, path)
+
+
+def _participant_settled(req: Dict, u: str, now_ripple: int) -> bool:
+    """Nothing more can happen on ledger for this participant's share."""
+    p = req["participants"][u]
+    if p.get("escrow_offer_sequence") is None:
+        # never escrowed: only a still-open request can get a late EscrowCreate
+        return compute_status(req) != "PENDING"
+    if req["finish_tx_hashes"].get(u) or p.get("escrow_cancel_tx_hash") or p.get("escrow_closed"):
+        return True
+    cancel_after = p.get("escrow_cancel_after")
+    return cancel_after is not None and int(cancel_after) < now_ripple
+
+def _watched_accounts() -> list[str]:
+    # vault (destination of every escrow) + participants whose shares can still change on ledger
+    out = []
+    if STATE["coordinator"] is not None:
+        out.append(STATE["coordinator"].classic_address)
+    now_ripple = ripple_time_now()
+    for req in open_requests():
+        for u, p in req["participants"].items():
+            if not _participant_settled(req, u, now_ripple):
+                out.append(p["address"])
+    return list(dict.fromkeys(out))
+
+def _stream_account(account: str, markers: Dict, validated: int) -> Iterable[Dict]:
+    """Yield account_tx entries for ledgers after the account's cursor, up to `validated`."""
+    cur = markers["accounts"].get(account)
+    if cur is None:
+        bootstrap = int(os.getenv("LEDGER_SYNC_BOOTSTRAP_LEDGERS", DEFAULT_BOOTSTRAP_LEDGERS))
+        cur = {"ledger_index": max(validated - bootstrap, 0), "marker": None, "upper": None}
+        markers["accounts"][account] = cur
+
+    # Resume an interrupted scan with its original bounds, otherwise start a new one.
+    upper = cur.get("upper") if cur.get("marker") is not None else None
+    if upper is None:
+        if cur["ledger_index"] >= validated:
+            return
+        upper = validated
+    marker = cur.get("marker")
+
+    while True:
+        res = account_tx_page(account, cur["ledger_index"] + 1, upper, marker=marker)
+        if "error" in res:
+            print("LEDGER SYNC: account_tx failed for", account, res.get("error"))
+            return
+
+        for entry in res.get("transactions") or []:
+            yield entry
+
+        marker = res.get("marker")
+        if marker is None:
+            cur.update({"ledger_index": upper, "marker": None, "upper": None})
+            save_markers(markers)
+            return
+        cur.update({"marker": marker, "upper": upper})
+        save_markers(markers)
+
+
+def _tx_fields(entry: Dict) -> Tuple[Dict, Dict, str]:
+    # api_version 2 uses tx_json + top-level hash, v1 nests everything under tx
+    tx = entry.get("tx_json") or entry.get("tx") or {}
+    meta = entry.get("meta") or {}
+    tx_hash = entry.get("hash") or tx.get("hash") or ""
+    return tx, meta, tx_hash
+
+def _participant_by_address(req: Dict, address: str) -> Optional[str]:
+    for u, p in req["participants"].items():
+        if p.get("address") == address or p.get("escrow_owner") == address:
+            return u
+    return None
+
+def _escrow_index() -> Dict[Tuple[str, int], Tuple[Dict, str]]:
+    idx = {}
+    for req in open_requests():
+        for u, p in req["participants"].items():
+            if p.get("escrow_owner") and p.get("escrow_offer_sequence") is not None:
+                idx[(p["escrow_owner"], int(p["escrow_offer_sequence"]))] = (req, u)
+    return idx
+
+def apply_tx(entry: Dict, escrows: Dict[Tuple[str, int], Tuple[Dict, str]]) -> bool:
+    """Repair the request a validated tx belongs to. Returns True if anything changed."""
+    req = _repair(entry, escrows)
+    if req is None:
+        return False
+    touch(req)
+    return True
+
+def _repair(entry: Dict, escrows: Dict[Tuple[str, int], Tuple[Dict, str]]) -> Optional[Dict]:
+    tx, meta, tx_hash = _tx_fields(entry)
+    if meta.get("TransactionResult") != "tesSUCCESS":
+        return None
+
+    tx_type = tx.get("TransactionType")
+    req_id = request_id_from_memos(tx)
+    req = STATE["requests"].get(req_id) if req_id else None
+
+    if tx_type == "EscrowCreate":
+        if req is None:
+            return None
+        u = _participant_by_address(req, tx.get("Account"))
+        if u is None:
+            return None
+        p = req["participants"][u]
+        if p["status"] == "PAID" and p.get("escrow_create_tx_hash") == tx_hash:
+            return None
+        p["status"] = "PAID"
+        p["escrow_owner"] = tx.get("Account")
+        p["escrow_offer_sequence"] = int(tx.get("Sequence") or tx.get("TicketSequence"))
+        p["escrow_create_tx_hash"] = tx_hash
+        p["escrow_cancel_after"] = tx.get("CancelAfter")
+        escrows[(p["escrow_owner"], p["escrow_offer_sequence"])] = (req, u)
+        return req
+
+    if tx_type in ("EscrowFinish", "EscrowCancel"):
+        hit = escrows.get((tx.get("Owner"), int(tx.get("OfferSequence", -1))))
+        if hit is None:
+            return None
+        req, u = hit
+        if tx_type == "EscrowFinish":
+            if req["finish_tx_hashes"].get(u) == tx_hash:
+                return None
+            req["finish_tx_hashes"][u] = tx_hash
+            if all(req["finish_tx_hashes"].get(pu) for pu in req["participants"]):
+                req["status"] = "FULFILLED"
+            return req
+        p = req["participants"][u]
+        if p.get("escrow_cancel_tx_hash") == tx_hash:
+            return None
+        p["escrow_cancel_tx_hash"] = tx_hash
+        if req["status"] != "FULFILLED":
+            req["status"] = "EXPIRED"
+        return req
+
+    if tx_type == "Payment":
+        if req is None or tx.get("Destination") != req.get("merchant_address"):
+            return None
+        if req.get("merchant_payment_tx_hash") == tx_hash:
+            return None
+        req["merchant_payment_tx_hash"] = tx_hash
+        req.pop("merchant_payment_pending", None)
+        return req
+
+    return None
+
+
+def _escrow_key(owner: str, offer_sequence: int) -> str:
+    return f"{owner}:{int(offer_sequence)}"
+
+def _track_escrow(markers: Dict, entry: Dict):
+    """Keep markers["escrows"] = Ripplit escrows created on ledger and not yet finished/cancelled."""
+    tx, meta, tx_hash = _tx_fields(entry)
+    if meta.get("TransactionResult") != "tesSUCCESS":
+        return
+    tx_type = tx.get("TransactionType")
+    if tx_type == "EscrowCreate":
+        req_id = request_id_from_memos(tx)
+        if not req_id:
+            return
+        seq = int(tx.get("Sequence") or tx.get("TicketSequence"))
+        markers["escrows"][_escrow_key(tx["Account"], seq)] = {
+            "owner": tx["Account"],
+            "offer_sequence": seq,
+            "request_id": req_id,
+            "amount_drops": tx.get("Amount"),
+            "cancel_after": tx.get("CancelAfter"),
+            "create_tx_hash": tx_hash,
+        }
+    elif tx_type in ("EscrowFinish", "EscrowCancel"):
+        markers["escrows"].pop(_escrow_key(tx.get("Owner", ""), tx.get("OfferSequence", -1)), None)
+
+def orphans(markers: Dict) -> list[Dict]:
+    return [e for e in markers["escrows"].values() if e["request_id"] not in STATE["requests"]]
+
+def _expired_escrows(markers: Dict) -> Dict[str, Tuple[str, int, Optional[Tuple[Dict, str]]]]:
+    """{key: (owner, offer_sequence, (req, user) or None for orphans)} past CancelAfter and still open."""
+    now = ripple_time_now()
+    out = {}
+    for e in orphans(markers):
+        if e.get("cancel_after") is not None and int(e["cancel_after"]) < now:
+            out[_escrow_key(e["owner"], e["offer_sequence"])] = (e["owner"], int(e["offer_sequence"]), None)
+    for req in open_requests():
+        for u, p in req["participants"].items():
+            if p.get("escrow_offer_sequence") is None:
+                continue
+            if req["finish_tx_hashes"].get(u) or p.get("escrow_cancel_tx_hash") or p.get("escrow_closed"):
+                continue
+            if p.get("escrow_cancel_after") is not None and int(p["escrow_cancel_after"]) < now:
+                seq = int(p["escrow_offer_sequence"])
+                out[_escrow_key(p["escrow_owner"], seq)] = (p["escrow_owner"], seq, (req, u))
+    return out
+
+def _cancel_expired_escrows(markers: Dict) -> list[str]:
+    """EscrowCancel every expired escrow (orphaned or not): submit them all, then wait on each."""
+    vault = STATE["coordinator"]
+    if vault is None:
+        return []
+    submitted = {}
+    for key, (owner, seq, hit) in _expired_escrows(markers).items():
+        try:
+            submitted[key] = (escrow_cancel_submit(vault, owner, seq), hit)
+        except Exception as ex:
+            print("LEDGER SYNC: escrow cancel failed for", key, ex)
+
+    cancelled = []
+    for key, ((tx_hash, last_ledger), hit) in submitted.items():
+        try:
+            wait_for_tx(tx_hash, last_ledger)
+        except TxFailed as ex:
+            if ex.result != "tecNO_TARGET":
+                print("LEDGER SYNC: escrow cancel failed for", key, ex)
+                continue
+            tx_hash = None  # already finished/cancelled by someone else
+        except Exception as ex:
+            print("LEDGER SYNC: escrow cancel failed for", key, ex)
+            continue
+        markers["escrows"].pop(key, None)
+        cancelled.append(key)
+        if hit is not None:
+            req, u = hit
+            p = req["participants"][u]
+            if tx_hash:
+                p["escrow_cancel_tx_hash"] = tx_hash
+            else:
+                p["escrow_closed"] = True  # gone from the ledger, outcome recorded elsewhere
+            if req["status"] != "FULFILLED":
+                req["status"] = "EXPIRED"
+            touch(req)
+    if cancelled:
+        save_markers(markers)
+    return cancelled
+
+def _resume(req: Dict):
+    rid = req["request_id"]
+    try:
+        settle(req)
+    except Exception as e:
+        failures = _RESUME_RETRY.get(rid, (0, 0.0))[0] + 1
+        delay = min(RESUME_BACKOFF_BASE_S * 2 ** (failures - 1), RESUME_BACKOFF_MAX_S)
+        _RESUME_RETRY[rid] = (failures, time.monotonic() + delay)
+        print(f"LEDGER SYNC: settlement of {rid} failed (attempt {failures}, retry in {delay:.0f}s):", e)
+    else:
+        _RESUME_RETRY.pop(rid, None)
+
+def _resume_settlements() -> list[str]:
+    now = time.monotonic()
+    for rid in list(_RESUME_RETRY):
+        if rid not in STATE["open_requests"]:
+            _RESUME_RETRY.pop(rid, None)
+    resumed = []
+    for req in open_requests():
+        retry = _RESUME_RETRY.get(req["request_id"])
+        if retry is not None and now < retry[1]:
+            continue
+        if needs_settlement(req):
+            threading.Thread(target=_resume, args=(req,), name="settle-resume", daemon=True).start()
+            resumed.append(req["request_id"])
+    return resumed
+
+
+def run_pass() -> Dict:
+    """Process every watched account's new ledgers once."""
+    with _PASS_LOCK:
+        markers = load_markers()
+        validated = latest_validated_ledger()
+        escrows = _escrow_index()
+        seen = set()
+        stats = {"validated_ledger": validated, "transactions": 0, "repaired": 0}
+
+        for account in _watched_accounts():
+            for entry in _stream_account(account, markers, validated):
+                _, _, tx_hash = _tx_fields(entry)
+                if tx_hash in seen:
+                    continue
+                seen.add(tx_hash)
+                stats["transactions"] += 1
+                _track_escrow(markers, entry)
+                if apply_tx(entry, escrows):
+                    stats["repaired"] += 1
+
+        save_markers(markers)
+        stats["settlements_resumed"] = _resume_settlements()
+        stats["escrows_cancelled"] = _cancel_expired_escrows(markers)
+        stats["orphans"] = orphans(markers)
+        if stats["repaired"] or stats["settlements_resumed"] or stats["escrows_cancelled"]:
+            print("LEDGER SYNC:", stats)
+        return stats
+
+
+def _loop(interval_s: float):
+    while not _STOP.wait(interval_s):
+        try:
+            run_pass()
+        except Exception as e:
+            print("LEDGER SYNC: pass failed:", e)
+
+def start_ledger_sync():
+    global _THREAD
+    if os.getenv("ENABLE_LEDGER_POLLING", "true").lower() != "true":
+        return
+    if _THREAD is not None and _THREAD.is_alive():
+        return
+    interval_s = float(os.getenv("LEDGER_POLL_SECONDS", "8"))
+    _STOP.clear()
+    _THREAD = threading.Thread(target=_loop, args=(interval_s,), name="ledger-sync", daemon=True)
+    _THREAD.start()
+
+def stop_ledger_sync():
+    _STOP.set()
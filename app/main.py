@@ -1,71 +1,101 @@
-from fastapi import FastAPI
-from fastapi.responses import HTMLResponse
+from fastapi import FastAPI, HTTPException
+from fastapi.responses import HTMLResponse, Response
 from fastapi.staticfiles import StaticFiles
 from pathlib import Path
 
 from .state import STATE
-from .models import InitResponse, StartFromRedirect, PayAction
+from .models import InitResponse, StartFromRedirect, PayAction, RequestResponse, InboxResponse, HistoryResponse
 from .xrpl_service import create_funded_wallet, get_balances, get_xrp_balance
 from .did_registry import seed_demo_dids
-from .group_pay import create_request_from_redirect, list_history, inbox_for, pay
+from .keystore import open_keystore
+from .signing import shutdown_pool
+from . import fx
+from .prewarm import READINESS, start_prewarm, stop_prewarm
+from .admission import ledger_lane, read_lane, configure_from_env, admission_stats
+from .config import DEMO_HANDLES
+from .group_pay import create_request_from_redirect, ensure_inited, inbox_for, pay
+from .ledger_sync import run_pass, start_ledger_sync, stop_ledger_sync
+from .views import ORJSONResponse, parse_fields, request_view, history_json
 
 BASE_DIR = Path(__file__).resolve().parent  # .../app
 STATIC_DIR = BASE_DIR / "static"           # .../app/static
 
-app = FastAPI(title="Ripplit")
+app = FastAPI(title="Ripplit", default_response_class=ORJSONResponse)
 app.mount("/static", StaticFiles(directory=str(STATIC_DIR)), name="static")
 
 @app.get("/", response_class=HTMLResponse)
 def root():
     return """<meta http-equiv="refresh" content="0; url=/static/login.html">"""
 
+@app.get("/readyz")
+def readyz():
+    return ORJSONResponse(READINESS, status_code=200 if READINESS["ready"] else 503)
+
 @app.get("/api/admin/balances")
 def admin_balances():
-    addrs = {
-        "alice": STATE["wallets"]["alice"].classic_address,
-        "bob": STATE["wallets"]["bob"].classic_address,
-        "chen": STATE["wallets"]["chen"].classic_address,
-        "vault": STATE["coordinator"].classic_address,
-        "merchant": STATE["merchant"].classic_address,
-    }
+    ks = STATE["keystore"]
+    addrs = {h: ks.address(h) for h in DEMO_HANDLES if h in ks}
+    addrs["vault"] = STATE["coordinator"].classic_address
+    addrs["merchant"] = STATE["merchant"].classic_address
     return {"wallets": addrs, "balances_xrp": get_balances(addrs)}
 
-@app.get("/api/wallet/balance/{user}")
+@app.get("/api/wallet/balance/{user}", dependencies=[read_lane])
 def wallet_balance(user: str):
-    if user not in ["alice", "bob", "chen", "merchant", "coordinator"]:
-        return {"error": "Unknown user"}
-
     if user in ["merchant", "coordinator"]:
         w = STATE[user]
         if w is None:
             return {"error": "Not initialized"}
         return {"user": user, "address": w.classic_address, "balance_xrp": get_xrp_balance(w.classic_address)}
 
-    if not STATE["wallets"]:
+    if STATE["keystore"] is None:
         return {"error": "Not initialized"}
+    if user not in STATE["keystore"]:
+        return {"error": "Unknown user"}
 
-    w = STATE["wallets"][user]
-    return {"user": user, "address": w.classic_address, "balance_xrp": get_xrp_balance(w.classic_address)}
+    address = STATE["keystore"].address(user)
+    return {"user": user, "address": address, "balance_xrp": get_xrp_balance(address)}
 
-@app.post("/api/ripplit/start")
-def start_from_marketplace(req: StartFromRedirect):
-    gpr = create_request_from_redirect(req)
-    return {"request": gpr}
+def _fields_or_400(fields: str | None):
+    try:
+        return parse_fields(fields)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
-@app.get("/api/ripplit/history")
+@app.post("/api/ripplit/start", responses={200: {"model": RequestResponse}}, dependencies=[ledger_lane])
+def start_from_marketplace(req: StartFromRedirect, fields: str | None = None):
+    projection = _fields_or_400(fields)
+    try:
+        gpr = create_request_from_redirect(req)
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return ORJSONResponse({"request": request_view(gpr, projection)})
+
+@app.get("/api/fx", dependencies=[read_lane])
+def fx_rates():
+    if fx.FX is None:
+        raise HTTPException(status_code=503, detail="FX cache not started")
+    snap = fx.FX.snapshot()
+    age = fx.FX.age_s()
+    max_age = 0 if age is None else max(int(fx.FX.ttl_s - age), 0)
+    return ORJSONResponse(snap, headers={"Cache-Control": f"public, max-age={max_age}"})
+
+@app.get("/api/ripplit/history", responses={200: {"model": HistoryResponse}}, dependencies=[read_lane])
 def history():
-    return {"history": list_history()}
+    ensure_inited()
+    return Response(content=history_json(), media_type="application/json")
 
-@app.get("/api/ripplit/inbox/{user}")
+@app.get("/api/ripplit/inbox/{user}", responses={200: {"model": InboxResponse}}, dependencies=[read_lane])
 def inbox(user: str):
-    if user not in ["bob", "chen"]:
-        return {"error": "Inbox only for bob/chen in this MVP"}
-    return {"requests": inbox_for(user)}
+    ensure_inited()
+    if user not in STATE["keystore"]:
+        return {"error": "Unknown user"}
+    return ORJSONResponse({"requests": [request_view(r) for r in inbox_for(user)]})
 
-@app.post("/api/ripplit/pay/{request_id}")
-def pay_api(request_id: str, action: PayAction):
+@app.post("/api/ripplit/pay/{request_id}", responses={200: {"model": RequestResponse}}, dependencies=[ledger_lane])
+def pay_api(request_id: str, action: PayAction, fields: str | None = None):
+    projection = _fields_or_400(fields)
     req = pay(request_id, action.payer)
-    return {"request": req}
+    return ORJSONResponse({"request": request_view(req, projection)})
 
 import os
 from dotenv import load_dotenv
@@ -83,16 +113,36 @@ def w(seed_name: str) -> Wallet:
 
 @app.on_event("startup")
 def startup():
-    STATE["wallets"] = {
-        "alice": w("ALICE_SEED"),
-        "bob": w("BOB_SEED"),
-        "chen": w("CHEN_SEED"),
-    }
+    configure_from_env()
+    STATE["keystore"] = open_keystore()
+    # demo users from .env; everyone else is added via scripts/keystore_import.py
+    for h in DEMO_HANDLES:
+        seed = os.getenv(f"{h.upper()}_SEED")
+        if seed:
+            STATE["keystore"].sync_seed(h, seed)
     STATE["coordinator"] = w("VAULT_SEED")   # vault account
     STATE["merchant"] = w("MERCHANT_SEED")   # optional
     seed_demo_dids()
 
     STATE.setdefault("requests", {})
+    start_ledger_sync()
+    fx.start_fx_refresher()
+    start_prewarm()
+
+@app.on_event("shutdown")
+def shutdown():
+    stop_prewarm()
+    stop_ledger_sync()
+    fx.stop_fx_refresher()
+    shutdown_pool()
+
+@app.get("/api/admin/admission")
+def admission():
+    return admission_stats()
+
+@app.post("/api/admin/ledger_sync")
+def ledger_sync_now():
+    return run_pass()
 
 from xrpl.models.requests import ServerInfo
 
@@ -100,58 +150,9 @@ from xrpl.models.requests import ServerInfo
 def server_info():
     return xrpl_service.client.request(ServerInfo()).result
 
-from fastapi import HTTPException
-
-@app.post("/api/ripplit/start")
-def start_from_marketplace(req: StartFromRedirect):
-    try:
-        return {"request": create_request_from_redirect(req)}
-    except Exception as e:
-        raise HTTPException(status_code=400, detail=str(e))
-    
-from fastapi import HTTPException
-
-@app.get("/api/ripplit/history/{user}")
-def history(user: str):
-    # validate user
-    from .state import STATE
-    if user not in ("alice", "bob", "chen"):
-        raise HTTPException(status_code=400, detail="Unknown user. Use alice/bob/chen.")
-
-    # If you still have ensure_inited(), keep it:
-    from .group_pay import ensure_inited, list_history
+@app.get("/api/ripplit/history/{user}", responses={200: {"model": HistoryResponse}}, dependencies=[read_lane])
+def history_for_user(user: str):
     ensure_inited()
-
-    # list_history() returns all tx summaries; we enrich with participants + unpaid list
-    out = []
-    for tx in STATE["requests"].values():
-        if user not in tx["participants"]:
-            continue
-
-        # compute status (reuse your logic if you already have _compute_status)
-        from .group_pay import _compute_status
-        status = _compute_status(tx)
-
-        unpaid = [u for u, p in tx["participants"].items() if p.get("status") != "PAID"]
-
-        out.append({
-            "request_id": tx["request_id"],
-            "order_id": tx["order_id"],
-            "item_label": tx.get("item_label", ""),
-            "total_xrp": tx["total_xrp"],
-            "status": status,  # PENDING / FULFILLED / EXPIRED
-            "created_at_unix": tx["created_at_unix"],
-            "expires_at_unix": tx["expires_at_unix"],
-            "unpaid": unpaid,
-            "participants": {
-                u: {
-                    "status": p.get("status"),
-                    "share_xrp": p.get("share_xrp"),
-                } for u, p in tx["participants"].items()
-            }
-        })
-
-    out.sort(key=lambda x: x["created_at_unix"], reverse=True)
-    return {"history": out}
-
-
+    if user not in STATE["keystore"]:
+        raise HTTPException(status_code=400, detail="Unknown user.")
+    return Response(content=history_json(user), media_type="application/json")
@@ -1,7 +1,9 @@
-from pydantic import BaseModel
-from typing import Dict, List, Literal, Optional
+from pydantic import BaseModel, StringConstraints
+from typing import Annotated, Dict, List, Literal, Optional
 
-User = Literal["alice", "bob", "chen"]
+from .keystore import HANDLE_RE
+
+User = Annotated[str, StringConstraints(pattern=HANDLE_RE.pattern)]
 
 class InitResponse(BaseModel):
     wallets: Dict[str, str]
@@ -12,6 +14,7 @@ class StartFromRedirect(BaseModel):
     order_id: str
     return_url: str
     item_label: str | None = None
+    initiator: User = "alice"
     selected_payees: list[str] = []
 
     # NEW:
@@ -33,6 +36,7 @@ class Participant(BaseModel):
     escrow_owner: Optional[str] = None
     escrow_offer_sequence: Optional[int] = None
     escrow_create_tx_hash: Optional[str] = None
+    escrow_cancel_after: Optional[int] = None  # ripple time
 
 class RequestSummary(BaseModel):
     request_id: str
@@ -41,3 +45,58 @@ class RequestSummary(BaseModel):
     status: Literal["PENDING", "FULFILLED", "EXPIRED"]
     created_at_unix: int
     expires_at_unix: int
+
+
+# ---- API response views (compact projections of the stored request dict) ----
+
+class ParticipantView(BaseModel):
+    status: Literal["REQUESTED", "PAID"]
+    share_xrp: float
+    escrow_create_tx_hash: Optional[str] = None
+
+class RequestView(BaseModel):
+    """
+    Every field is optional: a response carries only the fields selected with
+    ?fields= (DEFAULT_REQUEST_FIELDS when omitted).
+    """
+    request_id: Optional[str] = None
+    order_id: Optional[str] = None
+    item_label: Optional[str] = None
+    status: Optional[Literal["PENDING", "FULFILLED", "EXPIRED"]] = None
+    currency: Optional[str] = None
+    total_xrp: Optional[float] = None
+    total_rlusd: Optional[float] = None
+    created_at_unix: Optional[int] = None
+    expires_at_unix: Optional[int] = None
+    participants: Optional[Dict[str, ParticipantView]] = None
+
+    # opt-in via ?fields=
+    quote: Optional[Dict] = None
+    finish_tx_hashes: Optional[Dict[str, str]] = None
+    merchant_payment_tx_hash: Optional[str] = None
+
+DEFAULT_REQUEST_FIELDS = (
+    "request_id", "order_id", "item_label", "status", "currency",
+    "total_xrp", "total_rlusd", "created_at_unix", "expires_at_unix", "participants",
+)
+
+class HistoryRow(BaseModel):
+    request_id: str
+    order_id: str
+    item_label: str
+    total_xrp: float
+    total_rlusd: Optional[float] = None
+    status: Literal["PENDING", "FULFILLED", "EXPIRED"]
+    created_at_unix: int
+    expires_at_unix: int
+    unpaid: List[str]
+    participants: Dict[str, ParticipantView]
+
+class RequestResponse(BaseModel):
+    request: RequestView
+
+class InboxResponse(BaseModel):
+    requests: List[RequestView]
+
+class HistoryResponse(BaseModel):
+    history: List[HistoryRow]
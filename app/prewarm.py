@@ -0,0 +1,111 @@
+# app/prewarm.py
+"""
+Startup prewarm + readiness.
+
+Everything the first checkout would otherwise pay for is done once in a
+background thread right after startup: the binary codec and keypair code
+paths (a throwaway signature), the signing pool, the pooled RPC connection,
+fee / ledger / reserve lookups, and the vault's sequence and DepositAuth flag (an escrow to a DepositAuth vault fails with
+tecNO_PERMISSION). /readyz stays 503 until every step has passed, so a load
+balancer only routes traffic once first-request latency matches steady state.
+"""
+import os
+import threading
+import time
+from typing import Dict, Optional
+
+from .state import STATE
+from .config import DEMO_HANDLES
+
+LSF_DEPOSIT_AUTH = 0x01000000
+
+READINESS: Dict = {"ready": False, "started_at_unix": None, "checks": {}, "error": None}
+_STOP = threading.Event()
+
+
+def _step(name: str, fn):
+    t0 = time.perf_counter()
+    detail = fn()
+    READINESS["checks"][name] = {"ok": True, "ms": round((time.perf_counter() - t0) * 1e3, 1), **(detail or {})}
+
+
+def _crypto():
+    # loads the binary codec definitions and keypair code paths used by every tx
+    from xrpl.models.transactions import Payment
+    from xrpl.transaction import sign
+    from xrpl.wallet import Wallet
+
+    w, dest = Wallet.create(), Wallet.create()
+    sign(Payment(account=w.classic_address, destination=dest.classic_address, amount="1",
+                 fee="12", sequence=1, last_ledger_sequence=1), w)
+
+    from .signing import start_pool
+    start_pool()
+
+def _wallets():
+    ks = STATE["keystore"]
+    warmed = [h for h in DEMO_HANDLES if h in ks]
+    for h in warmed:
+        ks.wallet(h)
+    return {"wallets": warmed}
+
+def _ledger():
+    from xrpl.models.requests import ServerInfo
+    from xrpl.ledger import get_fee
+    from .xrpl_service import client
+
+    info = client.request(ServerInfo()).result["info"]
+    validated = info.get("validated_ledger") or {}
+    return {
+        "ledger_index": validated.get("seq"),
+        "reserve_base_xrp": validated.get("reserve_base_xrp"),
+        "fee_drops": get_fee(client),
+    }
+
+def _vault():
+    from xrpl.models.requests import AccountInfo
+    from .xrpl_service import client
+
+    vault = STATE["coordinator"].classic_address
+    res = client.request(AccountInfo(account=vault, ledger_index="validated")).result
+    if "account_data" not in res:
+        raise RuntimeError(f"vault {vault} not found: {res.get('error')}")
+    data = res["account_data"]
+    flags = int(data.get("Flags", 0))
+    if flags & LSF_DEPOSIT_AUTH:
+        raise RuntimeError(f"vault {vault} has DepositAuth set; run scripts/clear_vault_depositauth.py")
+    return {"vault": vault, "sequence": data.get("Sequence"), "flags": flags}
+
+
+def run_prewarm():
+    READINESS.update({"ready": False, "checks": {}, "error": None})
+    _step("crypto", _crypto)
+    _step("wallets", _wallets)
+    _step("ledger", _ledger)
+    _step("vault", _vault)
+    READINESS["ready"] = True
+
+
+def _loop(retry_s: float):
+    while not _STOP.is_set():
+        try:
+            run_prewarm()
+            print("PREWARM: ready", READINESS["checks"])
+            return
+        except Exception as e:
+            READINESS["error"] = str(e)
+            print("PREWARM: not ready:", e)
+        _STOP.wait(retry_s)
+
+def start_prewarm() -> Optional[threading.Thread]:
+    READINESS["started_at_unix"] = int(time.time())
+    if os.getenv("ENABLE_PREWARM", "true").lower() != "true":
+        READINESS["ready"] = True
+        return None
+    _STOP.clear()
+    t = threading.Thread(target=_loop, args=(float(os.getenv("PREWARM_RETRY_SECONDS", "5")),), name="prewarm", daemon=True)
+    t.start()
+    return t
+
+def stop_prewarm():
+    _STOP.set()
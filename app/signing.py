@@ -0,0 +1,98 @@
+# app/signing.py
+"""
+Transaction signing service.
+
+xrpl-py signs in pure Python (secp256k1/ed25519), so under the GIL signing
+caps how many checkouts one process can settle. Batches, and single
+transactions that arrive while another signature is already in flight, are
+signed in a process pool; a lone transaction on an idle server is signed
+in-process, which is cheaper than the round trip to a worker.
+
+SIGNING_WORKERS sets the pool size (0 disables the pool).
+"""
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Optional, Sequence, Tuple
+
+from xrpl.core.binarycodec import encode
+from xrpl.models.transactions.transaction import Transaction
+from xrpl.transaction import sign as _xrpl_sign
+from xrpl.wallet import Wallet
+
+_POOL: Optional[ProcessPoolExecutor] = None
+_POOL_LOCK = threading.Lock()
+_INFLIGHT = 0
+_INFLIGHT_LOCK = threading.Lock()
+
+
+def _default_workers() -> int:
+    return max((os.cpu_count() or 1) - 1, 0)
+
+def _workers() -> int:
+    return int(os.getenv("SIGNING_WORKERS", _default_workers()))
+
+
+# ---- worker side (must stay picklable / top-level) ----
+
+def _ping(_) -> int:
+    return os.getpid()
+
+def _sign_blob(tx_json: dict, public_key: str, private_key: str) -> str:
+    # built per call from the already-derived keypair: no seed derivation, and
+    # workers keep no key material between tasks
+    signed = _xrpl_sign(Transaction.from_xrpl(tx_json), Wallet(public_key, private_key))
+    return encode(signed.to_xrpl())
+
+
+# ---- pool ----
+
+def _pool() -> Optional[ProcessPoolExecutor]:
+    global _POOL
+    n = _workers()
+    if n <= 0:
+        return None
+    with _POOL_LOCK:
+        if _POOL is None:
+            # spawn, not fork: the server has RPC, ledger-sync and FX threads running
+            _POOL = ProcessPoolExecutor(max_workers=n, mp_context=multiprocessing.get_context("spawn"))
+        return _POOL
+
+def start_pool():
+    """Spawn the workers now rather than on the first batch."""
+    pool = _pool()
+    if pool is not None:
+        list(pool.map(_ping, range(_workers())))
+
+def shutdown_pool():
+    global _POOL
+    with _POOL_LOCK:
+        if _POOL is not None:
+            _POOL.shutdown(wait=False, cancel_futures=True)
+            _POOL = None
+
+
+# ---- public API ----
+
+def sign_batch(items: Sequence[Tuple[Transaction, Wallet]]) -> List[str]:
+    """Sign autofilled transactions; returns tx blobs in input order."""
+    global _INFLIGHT
+    if not items:
+        return []
+
+    with _INFLIGHT_LOCK:
+        busy = _INFLIGHT > 0
+        _INFLIGHT += 1
+    try:
+        pool = _pool() if (len(items) > 1 or busy) else None
+        if pool is None:
+            return [encode(_xrpl_sign(tx, w).to_xrpl()) for tx, w in items]
+        futures = [pool.submit(_sign_blob, tx.to_xrpl(), w.public_key, w.private_key) for tx, w in items]
+        return [f.result() for f in futures]
+    finally:
+        with _INFLIGHT_LOCK:
+            _INFLIGHT -= 1
+
+def sign(tx: Transaction, wallet: Wallet) -> str:
+    return sign_batch([(tx, wallet)])[0]
@@ -1,9 +1,47 @@
-from typing import Dict, Any
+import time
+from typing import Dict, Any, List
 
 STATE: Dict[str, Any] = {
-    "wallets": {},          # "alice"/"bob"/"chen" -> Wallet
+    "keystore": None,       # Keystore: handle -> encrypted seed, lazily derived Wallet
     "merchant": None,       # Wallet
     "coordinator": None,    # Wallet (submits EscrowFinish)
     "dids": {},             # did -> classic_address
     "requests": {},         # request_id -> dict
+    "orders": {},           # merchant order_id -> request_id (idempotent /start)
+    "open_requests": set(), # request_ids that can still change on ledger (see is_open)
 }
+
+def is_open(req: Dict[str, Any]) -> bool:
+    """Something can still happen on ledger for this request: the reconciler only looks at these."""
+    if req.get("merchant_payment_tx_hash"):
+        return False
+    ps = req["participants"]
+    if all(req["finish_tx_hashes"].get(u) for u in ps):
+        return True  # merchant payment still owed
+    for u, p in ps.items():
+        if p.get("escrow_offer_sequence") is None:
+            # a late EscrowCreate can only belong to a request that has not expired
+            if time.time() < req["expires_at_unix"]:
+                return True
+        elif not (req["finish_tx_hashes"].get(u) or p.get("escrow_cancel_tx_hash") or p.get("escrow_closed")):
+            return True
+    return False
+
+def touch(req: Dict[str, Any]):
+    """Bump a request's revision after mutating it so cached views get rebuilt."""
+    req["rev"] = req.get("rev", 0) + 1
+    if is_open(req):
+        STATE["open_requests"].add(req["request_id"])
+    else:
+        STATE["open_requests"].discard(req["request_id"])
+
+def open_requests() -> List[Dict[str, Any]]:
+    """Open requests, dropping ids that closed by the clock (expiry) since their last touch."""
+    out = []
+    for rid in list(STATE["open_requests"]):
+        req = STATE["requests"].get(rid)
+        if req is None or not is_open(req):
+            STATE["open_requests"].discard(rid)
+            continue
+        out.append(req)
+    return out
@@ -0,0 +1,107 @@
+# app/views.py
+"""
+Compact API projections of the stored request dicts.
+
+History rows are polled every few seconds by every open wallet, so each row
+is serialized once and cached as JSON bytes until its request's `rev`
+(bumped by state.touch) or its time-derived status changes.
+"""
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+import orjson
+from fastapi.responses import JSONResponse
+
+from .state import STATE, touch
+from .models import RequestView, DEFAULT_REQUEST_FIELDS
+from .group_pay import compute_status
+
+REQUEST_FIELDS = tuple(RequestView.model_fields)
+
+# request_id -> ((rev, status), row bytes)
+_ROW_CACHE: Dict[str, Tuple[Tuple[int, str], bytes]] = {}
+
+
+class ORJSONResponse(JSONResponse):
+    def render(self, content: Any) -> bytes:
+        return orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS)
+
+
+def parse_fields(fields: Optional[str]) -> Tuple[str, ...]:
+    if not fields:
+        return DEFAULT_REQUEST_FIELDS
+    out = tuple(f.strip() for f in fields.split(",") if f.strip())
+    unknown = [f for f in out if f not in REQUEST_FIELDS]
+    if unknown:
+        raise ValueError(f"Unknown fields: {', '.join(unknown)}. Allowed: {', '.join(REQUEST_FIELDS)}")
+    return out
+
+def _participants_view(req: Dict) -> Dict[str, Dict]:
+    return {
+        u: {
+            "status": p.get("status"),
+            "share_xrp": p.get("share_xrp"),
+            "escrow_create_tx_hash": p.get("escrow_create_tx_hash"),
+        } for u, p in req["participants"].items()
+    }
+
+def request_view(req: Dict, fields: Iterable[str] = DEFAULT_REQUEST_FIELDS) -> Dict:
+    out = {}
+    for f in fields:
+        if f == "status":
+            out[f] = compute_status(req)
+        elif f == "participants":
+            out[f] = _participants_view(req)
+        elif f == "item_label":
+            out[f] = req.get("item_label") or "Marketplace order"
+        elif f == "finish_tx_hashes":
+            out[f] = req.get("finish_tx_hashes") or {}
+        else:
+            out[f] = req.get(f)
+    return out
+
+
+def _history_row(req: Dict, status: str) -> Dict:
+    return {
+        "request_id": req["request_id"],
+        "order_id": req["order_id"],
+        "item_label": req.get("item_label", ""),
+        "total_xrp": req["total_xrp"],
+        "total_rlusd": req.get("total_rlusd"),
+        "status": status,  # PENDING / FULFILLED / EXPIRED
+        "created_at_unix": req["created_at_unix"],
+        "expires_at_unix": req["expires_at_unix"],
+        "unpaid": [u for u, p in req["participants"].items() if p.get("status") != "PAID"],
+        "participants": {
+            u: {"status": p.get("status"), "share_xrp": p.get("share_xrp")}
+            for u, p in req["participants"].items()
+        },
+    }
+
+def _row_bytes(req: Dict) -> bytes:
+    status = compute_status(req)
+    if status == "EXPIRED" and req["status"] != "EXPIRED":
+        req["status"] = "EXPIRED"
+        touch(req)
+
+    key = (req.get("rev", 0), status)
+    hit = _ROW_CACHE.get(req["request_id"])
+    if hit is not None and hit[0] == key:
+        return hit[1]
+
+    row = orjson.dumps(_history_row(req, status))
+    _ROW_CACHE[req["request_id"]] = (key, row)
+    return row
+
+def evict_row(request_id: str):
+    """Drop a cached row for a request that was removed from STATE."""
+    _ROW_CACHE.pop(request_id, None)
+
+def history_json(user: Optional[str] = None) -> bytes:
+    """`{"history": [HistoryRow, ...]}` newest first, optionally only requests `user` is part of."""
+    rows = []
+    # STATE["requests"] is insertion ordered by creation time, so reversing it is newest first.
+    for req in reversed(list(STATE["requests"].values())):
+        if user is not None and user not in req["participants"]:
+            continue
+        rows.append(_row_bytes(req))
+    return b'{"history":[' + b",".join(rows) + b"]}"
@@ -1,22 +1,155 @@
 from datetime import datetime, timezone, timedelta
 import time
-from typing import Dict
+from typing import Dict, Optional, Tuple
 
 from decimal import Decimal
 from xrpl.utils import xrp_to_drops
 from xrpl.clients import JsonRpcClient
 from xrpl.wallet import Wallet, generate_faucet_wallet
-from xrpl.utils import datetime_to_ripple_time, xrp_to_drops
-from xrpl.models.requests import AccountInfo
-from xrpl.models.transactions import EscrowCreate, EscrowFinish
-from xrpl.transaction import submit_and_wait
+from xrpl.utils import datetime_to_ripple_time, xrp_to_drops, str_to_hex, hex_to_str
+from xrpl.models.requests import AccountInfo, AccountTx, Tx
+from xrpl.models.transactions import EscrowCancel, EscrowCreate, EscrowFinish, Memo
+from xrpl.models.transactions.transaction import Transaction
+from xrpl.transaction import autofill, submit
+from xrpl.account import get_next_valid_seq_number
 from .config import XRPL_TESTNET_JSON_RPC, ESCROW_FINISH_AFTER_S, ESCROW_CANCEL_AFTER_S
+from . import signing
 import os
+import threading
+from collections import defaultdict
+import httpx
 from xrpl.clients import JsonRpcClient
+from xrpl.asyncio.clients.exceptions import XRPLRequestFailureException
+from xrpl.asyncio.clients.utils import json_to_response, request_to_json_rpc
+
+
+class PooledJsonRpcClient(JsonRpcClient):
+    """
+    JsonRpcClient that keeps one keep-alive httpx connection pool for the
+    process. The stock client opens a new AsyncClient (TCP + TLS handshake)
+    for every request, and a single submit_and_wait makes several.
+    """
+
+    def __init__(self, url: str):
+        super().__init__(url)
+        self._http = httpx.Client(
+            timeout=10.0,
+            limits=httpx.Limits(max_connections=32, max_keepalive_connections=16),
+        )
+
+    async def _request_impl(self, request, *, timeout: float = 10.0):
+        response = self._http.post(self.url, json=request_to_json_rpc(request), timeout=timeout)
+        try:
+            return json_to_response(response.json())
+        except ValueError:
+            raise XRPLRequestFailureException({"error": response.status_code, "error_message": response.text})
+
 
 XRPL_RPC = os.getenv("XRPL_RPC", "https://testnet.xrpl-labs.com/")
-client = JsonRpcClient(XRPL_RPC)
+client = PooledJsonRpcClient(XRPL_RPC)
+
+
+# Every tx we submit for a request carries its request_id in a memo, so the
+# ledger reconciler can map on-ledger activity back to STATE["requests"].
+REQUEST_MEMO_TYPE = "ripplit/request_id"
+
+
+def _request_memos(request_id: str | None):
+    if not request_id:
+        return None
+    return [Memo(memo_type=str_to_hex(REQUEST_MEMO_TYPE), memo_data=str_to_hex(request_id))]
+
+def request_id_from_memos(tx_json: Dict) -> str | None:
+    for m in tx_json.get("Memos") or []:
+        memo = m.get("Memo") or {}
+        try:
+            if hex_to_str(memo.get("MemoType", "")) == REQUEST_MEMO_TYPE:
+                return hex_to_str(memo.get("MemoData", ""))
+        except ValueError:
+            continue
+    return None
+
+# Sequence allocation, signing and submission are serialized per sending
+# account: the vault finishes escrows, pays merchants and cancels orphans from
+# several threads, and two autofills racing on one account would pick the same
+# Sequence. Waiting for validation happens outside the lock, so transactions
+# from one account still pipeline into the same ledger.
+_ACCOUNT_LOCKS: Dict[str, threading.Lock] = defaultdict(threading.Lock)
+_ACCOUNT_LOCKS_GUARD = threading.Lock()
+
+def _account_lock(address: str) -> threading.Lock:
+    with _ACCOUNT_LOCKS_GUARD:
+        return _ACCOUNT_LOCKS[address]
+
+
+class TxFailed(RuntimeError):
+    """
+    The transaction definitely did not apply and never will: rejected on
+    submit (tem/tef), validated with a non-tesSUCCESS result, or its
+    LastLedgerSequence passed without it. Anything else raised while
+    submitting or waiting (timeouts, RPC errors) leaves the outcome unknown.
+    """
+
+    def __init__(self, tx_hash: str, result: str):
+        super().__init__(f"Transaction failed: {result}")
+        self.tx_hash = tx_hash
+        self.result = result
+
+
+class BatchAborted(RuntimeError):
+    """A batch submission failed part-way; `done` holds {key: tx_hash} for the ones that landed."""
 
+    def __init__(self, key: str, error: Exception, done: Dict[str, str]):
+        super().__init__(f"batch aborted at {key}: {error}")
+        self.key = key
+        self.done = done
+
+
+def _send(signed: Transaction):
+    """Plain submit; raises TxFailed if the server rejects it outright."""
+    result = submit(signed, client).result
+    engine_result = result.get("engine_result", "")
+    if engine_result.startswith(("tem", "tef")):
+        raise TxFailed(signed.get_hash(), engine_result)
+
+def submit_tx(tx, wallet: Wallet, on_signed=None) -> Tuple[str, int]:
+    """
+    autofill here (network), sign via the signing service (CPU) and submit,
+    without waiting. Returns (tx_hash, LastLedgerSequence). `on_signed(tx_hash,
+    last_ledger_sequence)` runs before the submit, so a caller can record what
+    it is about to send.
+    """
+    with _account_lock(wallet.classic_address):
+        signed = Transaction.from_blob(signing.sign(autofill(tx, client), wallet))
+        tx_hash, last_ledger = signed.get_hash(), int(signed.last_ledger_sequence)
+        if on_signed is not None:
+            on_signed(tx_hash, last_ledger)
+        _send(signed)
+    return tx_hash, last_ledger
+
+def tx_outcome(tx_hash: str, last_ledger_sequence: int) -> Optional[Dict]:
+    """One look: the validated tx result on success, None while still pending; TxFailed if it failed or expired."""
+    validated = latest_validated_ledger()
+    res = client.request(Tx(transaction=tx_hash)).result
+    if res.get("validated"):
+        code = res["meta"]["TransactionResult"]
+        if code != "tesSUCCESS":
+            raise TxFailed(tx_hash, code)
+        return res
+    if validated > int(last_ledger_sequence):
+        raise TxFailed(tx_hash, "LastLedgerSequence passed")
+    return None
+
+def wait_for_tx(tx_hash: str, last_ledger_sequence: int, poll_s: float = 1.0) -> Dict:
+    while True:
+        res = tx_outcome(tx_hash, last_ledger_sequence)
+        if res is not None:
+            return res
+        time.sleep(poll_s)
+
+def _submit(tx, wallet: Wallet, on_signed=None) -> Dict:
+    """Submit under the account lock, then wait for validation outside it."""
+    return wait_for_tx(*submit_tx(tx, wallet, on_signed=on_signed))
 
 def _ripple_time_in(seconds_from_now: int) -> int:
     return datetime_to_ripple_time(datetime.utcnow()) + int(seconds_from_now)
@@ -31,7 +164,7 @@ def get_xrp_balance(address: str) -> float:
 def get_balances(addresses: Dict[str, str]) -> Dict[str, float]:
     return {k: get_xrp_balance(v) for k, v in addresses.items()}
 
-def escrow_create(owner_wallet, destination: str, amount_xrp: float | Decimal):
+def escrow_create(owner_wallet, destination: str, amount_xrp: float | Decimal, request_id: str | None = None, on_signed=None):
     now_utc = datetime.now(timezone.utc)
 
     # make it finishable shortly after submission
@@ -48,36 +181,104 @@ def escrow_create(owner_wallet, destination: str, amount_xrp: float | Decimal):
         amount=amount_drops,
         finish_after=finish_after,
         cancel_after=cancel_after,
+        memos=_request_memos(request_id),
     )
 
     print("ESCROW TX:", tx.to_xrpl())
 
-    result = submit_and_wait(tx, client, owner_wallet).result
+    result = _submit(tx, owner_wallet, on_signed=on_signed)
     return {
         "tx_hash": result.get("hash"),
         "sequence": result["tx_json"]["Sequence"],  # or offer sequence depending on your implementation
+        "cancel_after": cancel_after,
     }
 
-def wait_until_finishable():
-    time.sleep(max(ESCROW_FINISH_AFTER_S + 1, 2))
+def ripple_time_now() -> int:
+    return datetime_to_ripple_time(datetime.now(timezone.utc))
 
-def escrow_finish(finisher_wallet: Wallet, owner_address: str, offer_sequence: int) -> str:
-    tx = EscrowFinish(
-        account=finisher_wallet.classic_address,
+def escrow_cancel_submit(canceller_wallet: Wallet, owner_address: str, offer_sequence: int) -> Tuple[str, int]:
+    """
+    Submit an EscrowCancel (allowed from any account once CancelAfter has
+    passed) without waiting: returns (tx_hash, LastLedgerSequence) for wait_for_tx.
+    """
+    tx = EscrowCancel(
+        account=canceller_wallet.classic_address,
         owner=owner_address,
         offer_sequence=int(offer_sequence),
     )
-    result = submit_and_wait(tx, client, finisher_wallet).result
-    return result.get("hash", "")
+    return submit_tx(tx, canceller_wallet)
+
+def wait_until_finishable():
+    time.sleep(max(ESCROW_FINISH_AFTER_S + 1, 2))
+
+def escrow_finish_batch(finisher_wallet: Wallet, escrows: Dict[str, tuple], request_id: str | None = None) -> Dict[str, str]:
+    """
+    Finish several escrows from one account: {key: (owner_address, offer_sequence)} -> {key: tx_hash}.
+    Sequences are assigned up front so all finishes can be signed as one batch
+    and submitted back to back under the account lock; validation is awaited
+    after the lock is released. A rejected or unclear submit stops the rest
+    (their sequences would leave a gap). Any failure raises BatchAborted
+    carrying the finishes that did validate.
+    """
+    submitted: Dict[str, Tuple[str, int]] = {}
+    failure = None
+    with _account_lock(finisher_wallet.classic_address):
+        base_seq = get_next_valid_seq_number(finisher_wallet.classic_address, client)
+        txs = []
+        for i, (owner_address, offer_sequence) in enumerate(escrows.values()):
+            tx = EscrowFinish(
+                account=finisher_wallet.classic_address,
+                owner=owner_address,
+                offer_sequence=int(offer_sequence),
+                sequence=base_seq + i,
+                memos=_request_memos(request_id),
+            )
+            txs.append((autofill(tx, client), finisher_wallet))
+
+        blobs = signing.sign_batch(txs)
+        for key, blob in zip(escrows, blobs):
+            signed = Transaction.from_blob(blob)
+            try:
+                _send(signed)
+            except Exception as e:
+                failure = (key, e)
+                break
+            submitted[key] = (signed.get_hash(), int(signed.last_ledger_sequence))
+
+    out = {}
+    for key, (tx_hash, last_ledger) in submitted.items():
+        try:
+            out[key] = wait_for_tx(tx_hash, last_ledger).get("hash", tx_hash)
+        except Exception as e:
+            failure = failure or (key, e)
+    if failure is not None:
+        raise BatchAborted(failure[0], failure[1], out) from failure[1]
+    return out
 
 from xrpl.models.transactions import Payment
 
-def send_payment(sender_wallet: Wallet, destination: str, amount_xrp: float) -> str:
+def send_payment(sender_wallet: Wallet, destination: str, amount_xrp: float, request_id: str | None = None, on_signed=None) -> str:
     tx = Payment(
         account=sender_wallet.classic_address,
         destination=destination,
         amount=xrp_to_drops(amount_xrp),
+        memos=_request_memos(request_id),
     )
-    result = submit_and_wait(tx, client, sender_wallet).result
+    result = _submit(tx, sender_wallet, on_signed=on_signed)
     return result.get("hash", "")
 
+def latest_validated_ledger() -> int:
+    from xrpl.ledger import get_latest_validated_ledger_sequence
+    return int(get_latest_validated_ledger_sequence(client))
+
+def account_tx_page(account: str, ledger_index_min: int, ledger_index_max: int, marker=None, limit: int = 200) -> Dict:
+    """One page of account_tx over [ledger_index_min, ledger_index_max], oldest first."""
+    return client.request(AccountTx(
+        account=account,
+        ledger_index_min=int(ledger_index_min),
+        ledger_index_max=int(ledger_index_max),
+        forward=True,
+        limit=limit,
+        marker=marker,
+    )).result
+
@@ -1,4 +1,4 @@
-from fastapi import FastAPI
+from fastapi import FastAPI, HTTPException, Query
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import HTMLResponse
 from fastapi.staticfiles import StaticFiles
@@ -18,7 +18,53 @@ app.add_middleware(
 )
 app.mount("/static", StaticFiles(directory="static"), name="static")
 
-ORDERS: Dict[str, Dict[str, Any]] = {}
+class OrderStore:
+    """
+    Orders indexed by id plus an insertion-ordered id list, so listing is a
+    slice (newest first) and lookups stay O(1). The Ripplit redirect URL is
+    built once when the order is created.
+    """
+
+    def __init__(self):
+        self._by_id: Dict[str, Dict[str, Any]] = {}
+        self._seq: List[str] = []            # insertion order
+        self._pos: Dict[str, int] = {}       # order_id -> index in _seq
+
+    def __contains__(self, order_id: str) -> bool:
+        return order_id in self._by_id
+
+    def __len__(self) -> int:
+        return len(self._seq)
+
+    def get(self, order_id: str) -> Optional[Dict[str, Any]]:
+        return self._by_id.get(order_id)
+
+    def add(self, order: Dict[str, Any]) -> Dict[str, Any]:
+        order_id = order["order_id"]
+        order["redirect_url"] = _build_redirect(order)
+        self._pos[order_id] = len(self._seq)
+        self._seq.append(order_id)
+        self._by_id[order_id] = order
+        return order
+
+    def page(self, cursor: Optional[str] = None, limit: int = 50) -> Dict[str, Any]:
+        """Newest first. `cursor` is the order_id of the last row of the previous page."""
+        if cursor is None:
+            end = len(self._seq)
+        elif cursor in self._pos:
+            end = self._pos[cursor]
+        else:
+            raise KeyError(cursor)
+        start = max(end - limit, 0)
+        ids = self._seq[start:end]
+        ids.reverse()
+        return {
+            "orders": [self._by_id[i] for i in ids],
+            "next_cursor": self._seq[start] if start > 0 else None,
+        }
+
+
+ORDERS = OrderStore()
 
 RIPPLIT_PAY_URL = os.getenv("RIPPLIT_PAY_URL", "http://127.0.0.1:8000/static/login.html")
 RIPPLIT_API_BASE = os.getenv("RIPPLIT_API_BASE", "http://127.0.0.1:8000")
@@ -104,10 +150,12 @@ def home():
 
 
 @app.get("/api/orders")
-def list_orders():
+def list_orders(cursor: Optional[str] = None, limit: int = Query(50, ge=1, le=200)):
     # newest first
-    orders = list(reversed(list(ORDERS.values())))
-    return {"orders": [{**o, "redirect_url": _build_redirect(o)} for o in orders]}
+    try:
+        return ORDERS.page(cursor=cursor, limit=limit)
+    except KeyError:
+        raise HTTPException(status_code=400, detail=f"Unknown cursor: {cursor}")
 
 
 # @app.post("/api/order/create")
@@ -155,10 +203,8 @@ def create_order(req: CreateOrderReq):
         "status": "PENDING_GROUPPAY",
         "details": None,
     }
-    ORDERS[order_id] = order
-
-    redirect_url = _build_redirect(order)
-    return {"order": order, "redirect_url": redirect_url}
+    ORDERS.add(order)
+    return {"order": order, "redirect_url": order["redirect_url"]}
 
 
 
@@ -166,6 +212,7 @@ def create_order(req: CreateOrderReq):
 def ripplit_callback(cb: RipplitCallback):
     if cb.order_id not in ORDERS:
         return {"error": "Unknown order_id"}
-    ORDERS[cb.order_id]["status"] = cb.status
-    ORDERS[cb.order_id]["details"] = cb.details
+    order = ORDERS.get(cb.order_id)
+    order["status"] = cb.status
+    order["details"] = cb.details
     return {"ok": True}
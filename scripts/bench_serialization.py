@@ -0,0 +1,109 @@
+"""
+Serialization benchmark for the history poll and start/pay payloads.
+
+    python scripts/bench_serialization.py [n_requests] [polls]
+
+Compares the old path (rebuild a dict per request on every poll, json.dumps
+via JSONResponse, full request dict on start/pay) with app.views (cached
+orjson row bytes, compact request view).
+
+History rows are ~5% larger than before because they now carry
+`total_rlusd` (the wallet shows the RLUSD total when present); the win on
+the history poll is CPU, the byte win is on start/pay.
+"""
+import json
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from app.state import STATE
+from app.group_pay import compute_status
+from app.views import history_json, request_view
+
+N = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+POLLS = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+
+
+def fake_request(i: int) -> dict:
+    now = int(time.time())
+    users = ["alice", "bob", "chen"]
+    return {
+        "vault_address": "rVaultXXXXXXXXXXXXXXXXXXXXXXXXXXXX",
+        "request_id": f"tx_{i:08x}",
+        "order_id": f"ord_{i:08x}",
+        "item_label": "Marketplace order",
+        "total_xrp": 12.345678,
+        "currency": "RLUSD",
+        "total_rlusd": 24.0,
+        "quote": {"rate_xrp_per_rlusd": 0.5, "total_xrp": 12.24, "buffer": 1.02, "source": "fallback_constant"},
+        "return_url": "http://127.0.0.1:8010/api/order/ripplit_callback",
+        "merchant_address": "rMerchantXXXXXXXXXXXXXXXXXXXXXXXXX",
+        "created_at_unix": now + i,
+        "expires_at_unix": now + i + 3600,
+        "status": "PENDING",
+        "participants": {
+            u: {
+                "did": f"did:ripplit:{u}",
+                "address": f"r{u}XXXXXXXXXXXXXXXXXXXXXXXXXXXXX",
+                "share_xrp": 4.115226,
+                "status": "PAID",
+                "escrow_owner": f"r{u}XXXXXXXXXXXXXXXXXXXXXXXXXXXXX",
+                "escrow_offer_sequence": 1000 + i,
+                "escrow_create_tx_hash": "A" * 64,
+            } for u in users
+        },
+        "finish_tx_hashes": {u: "B" * 64 for u in users},
+    }
+
+
+def legacy_history(user: str) -> bytes:
+    out = []
+    for tx in STATE["requests"].values():
+        if user not in tx["participants"]:
+            continue
+        out.append({
+            "request_id": tx["request_id"],
+            "order_id": tx["order_id"],
+            "item_label": tx.get("item_label", ""),
+            "total_xrp": tx["total_xrp"],
+            "status": compute_status(tx),
+            "created_at_unix": tx["created_at_unix"],
+            "expires_at_unix": tx["expires_at_unix"],
+            "unpaid": [u for u, p in tx["participants"].items() if p.get("status") != "PAID"],
+            "participants": {
+                u: {"status": p.get("status"), "share_xrp": p.get("share_xrp")}
+                for u, p in tx["participants"].items()
+            },
+        })
+    out.sort(key=lambda x: x["created_at_unix"], reverse=True)
+    # what starlette's JSONResponse.render does
+    return json.dumps({"history": out}, ensure_ascii=False, allow_nan=False, indent=None, separators=(",", ":")).encode("utf-8")
+
+
+def bench(label: str, fn, polls: int):
+    fn()  # warm
+    t0 = time.perf_counter()
+    for _ in range(polls):
+        body = fn()
+    dt = time.perf_counter() - t0
+    print(f"{label:<28} {dt / polls * 1e3:8.3f} ms/poll  {len(body):>9} bytes")
+
+
+if __name__ == "__main__":
+    STATE["requests"] = {}
+    for i in range(N):
+        r = fake_request(i)
+        STATE["requests"][r["request_id"]] = r
+
+    print(f"{N} requests, {POLLS} polls")
+    bench("history legacy (json)", lambda: legacy_history("bob"), POLLS)
+    bench("history cached (orjson)", lambda: history_json("bob"), POLLS)
+
+    sample = next(iter(STATE["requests"].values()))
+    full = json.dumps({"request": sample}, separators=(",", ":")).encode("utf-8")
+    import orjson
+    compact = orjson.dumps({"request": request_view(sample)})
+    print(f"{'start/pay full dict':<28} {len(full):>26} bytes")
+    print(f"{'start/pay compact view':<28} {len(compact):>26} bytes")
@@ -0,0 +1,64 @@
+"""
+Signing throughput benchmark (offline, no network).
+
+    python scripts/bench_signing.py [n_txs] [max_workers]
+
+Signs n_txs Payments in-process, then through app.signing with
+SIGNING_WORKERS = 1, 2, 4, ... up to max_workers (default: cpu count),
+and prints signed transactions per second for each.
+"""
+import os
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from xrpl.models.transactions import Payment
+from xrpl.transaction import sign
+from xrpl.wallet import Wallet
+
+from app import signing
+
+N = int(sys.argv[1]) if len(sys.argv) > 1 else 400
+MAX_WORKERS = int(sys.argv[2]) if len(sys.argv) > 2 else (os.cpu_count() or 1)
+
+
+def make_batch(n: int):
+    senders = [Wallet.create() for _ in range(8)]
+    dest = Wallet.create().classic_address
+    return [
+        (Payment(
+            account=w.classic_address,
+            destination=dest,
+            amount="1000000",
+            fee="12",
+            sequence=1000 + i,
+            last_ledger_sequence=99_999_999,
+        ), w)
+        for i, w in ((i, senders[i % len(senders)]) for i in range(n))
+    ]
+
+def report(label: str, n: int, dt: float):
+    print(f"{label:<22} {n / dt:10.1f} tx/s")
+
+
+if __name__ == "__main__":
+    batch = make_batch(N)
+    print(f"{N} transactions, {os.cpu_count()} cpu(s)")
+
+    t0 = time.perf_counter()
+    for tx, w in batch:
+        sign(tx, w)
+    report("in-process", N, time.perf_counter() - t0)
+
+    workers = 1
+    while workers <= MAX_WORKERS:
+        os.environ["SIGNING_WORKERS"] = str(workers)
+        signing.shutdown_pool()
+        signing.start_pool()
+        t0 = time.perf_counter()
+        signing.sign_batch(batch)
+        report(f"pool, {workers} worker(s)", N, time.perf_counter() - t0)
+        workers *= 2
+    signing.shutdown_pool()
@@ -18,5 +18,6 @@ if not vault_addr:
     raise RuntimeError("Set VAULT_ADDRESS in .env (your vault classic address)")
 
 res = client.request(AccountInfo(account=vault_addr, ledger_index="validated")).result
-print(res["account_data"].get("Flags"))
+flags = int(res["account_data"].get("Flags", 0))
+print(flags, "DepositAuth:", bool(flags & 0x01000000))  # the API's /readyz runs the same check
 print(res["account_data"])
@@ -0,0 +1,31 @@
+"""
+Bulk-import custodial seeds into the keystore.
+
+    python scripts/keystore_import.py < seeds.txt
+
+Each input line is `<handle> <seed>`. Uses KEYSTORE_DIR / KEYSTORE_PASSPHRASE
+from .env. Existing handles are skipped unless --overwrite is passed.
+"""
+import sys
+from pathlib import Path
+
+from dotenv import load_dotenv
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+load_dotenv(ROOT / ".env")
+
+from app.keystore import open_keystore
+
+if __name__ == "__main__":
+    overwrite = "--overwrite" in sys.argv[1:]
+    ks = open_keystore()
+    n = 0
+    for line in sys.stdin:
+        line = line.strip()
+        if not line or line.startswith("#"):
+            continue
+        handle, seed = line.split()[:2]
+        print(handle, ks.import_seed(handle, seed, overwrite=overwrite))
+        n += 1
+    print(f"imported {n} seed(s) into {ks.dir}")